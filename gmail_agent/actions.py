@@ -1,9 +1,10 @@
 """
 Action Handler.
 Executes actions (Label, Archive) on emails and creates filters for trusted senders.
+Label/Archive changes are queued and applied in bulk by `flush()`.
 Handles Dry-Run logic to prevent unwanted changes during testing.
 """
-from typing import Any
+from typing import Any, Dict, List, Tuple
 from .logger import logger
 from .storage import MARKETING_TYPES
 
@@ -14,17 +15,22 @@ class ActionHandler:
     def __init__(self, gmail_service: Any, dry_run: bool = False) -> None:
         self.gmail = gmail_service
         self.dry_run = dry_run
+        # (label_name, archive) -> message IDs waiting to be modified
+        self._pending: Dict[Tuple[str, bool], List[str]] = {}
+        # classification -> label name
+        self._labels: Dict[str, str] = {}
 
     def execute_action(self, message_id: str, action: str, classification: str) -> None:
         """
         Execute the determined action on a message.
+        The change is queued and sent to Gmail on the next `flush()`.
         
         Args:
             message_id: The ID of the message.
             action: The action to take ('ARCHIVE', 'REVIEW', 'SKIP').
             classification: The classification category.
         """
-        label_name = f"AUTO/{classification.capitalize()}"
+        label_name = self._resolve_label(classification)
         
         if action == "SKIP":
             logger.info(f"Action: SKIP for {message_id}")
@@ -36,12 +42,34 @@ class ActionHandler:
                 logger.info(f"[DRY RUN] Would archive {message_id}")
             return
 
-        # Apply Label
-        self.gmail.add_label(message_id, label_name)
+        # Queue Label (and Archive if needed)
+        key = (label_name, action == "ARCHIVE")
+        self._pending.setdefault(key, []).append(message_id)
+
+    def _resolve_label(self, classification: str) -> str:
+        """
+        Resolve the Gmail label name used for a classification.
+        Label IDs are looked up by GmailService, which caches the label map for the run.
         
-        # Archive if needed
-        if action == "ARCHIVE":
-            self.gmail.archive_message(message_id)
+        Args:
+            classification: The classification category.
+            
+        Returns:
+            The label name, e.g. 'AUTO/Newsletter'.
+        """
+        label_name = self._labels.get(classification)
+        if label_name is None:
+            label_name = f"AUTO/{classification.capitalize()}"
+            self._labels[classification] = label_name
+        return label_name
+
+    def flush(self) -> None:
+        """
+        Apply all queued actions, one batchModify call per (label, archive) group.
+        """
+        pending, self._pending = self._pending, {}
+        for (label_name, archive), message_ids in pending.items():
+            self.gmail.batch_modify(message_ids, label_name, archive=archive)
 
     def create_filter_if_trusted(self, sender_email: str, classification: str, is_trusted: bool) -> None:
         """
@@ -59,7 +87,7 @@ class ActionHandler:
         if classification not in MARKETING_TYPES:
             return
 
-        label_name = f"AUTO/{classification.capitalize()}"
+        label_name = self._resolve_label(classification)
         
         if self.dry_run:
             logger.info(f"[DRY RUN] Would create filter for {sender_email} -> {label_name}")
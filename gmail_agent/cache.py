@@ -0,0 +1,158 @@
+"""
+On-disk cache for the Gmail Cleanup Agent.
+Stores raw Gmail message resources by message ID and LLM classifications by email content
+in a SQLite database (config.CACHE_FILE), so re-runs over the same messages skip the
+Gmail round trip and the LLM call. Message content never changes, so entries never expire;
+messages are parsed on read, so changes to the parsing code apply to cached messages too.
+"""
+import atexit
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from .config import CACHE_FILE
+from .logger import logger
+from .utils import chunked, dumps, loads
+
+def _content_key(scope: str, subject: str, snippet: str, sender: str) -> str:
+    """Hash of the classifier scope (model, prompt version) and the fields the LLM prompt is built from."""
+    return hashlib.sha256('\0'.join((scope, subject, snippet, sender)).encode('utf-8')).hexdigest()
+
+class Cache:
+    """
+    SQLite-backed cache shared by GmailService and LLMService.
+    One connection guarded by a lock, because the fetch and classify stages run on different threads.
+    Errors are logged and treated as cache misses.
+    """
+    def __init__(self, path: str = CACHE_FILE) -> None:
+        self.path: str = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Older versions stored parsed details here; they cannot be re-parsed, so drop them
+            conn.execute("DROP TABLE IF EXISTS messages")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS raw_messages "
+                "(id TEXT NOT NULL, scope TEXT NOT NULL, message BLOB NOT NULL, PRIMARY KEY (id, scope))"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS classifications "
+                "(key TEXT PRIMARY KEY, classification TEXT NOT NULL, confidence REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+            atexit.register(self.close)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to open cache {path}, continuing without it: {e}")
+
+    def close(self) -> None:
+        """Closes the database connection. Safe to call more than once."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get_messages(self, ids: List[str], scope: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up cached raw message resources.
+        
+        Args:
+            ids: Message IDs to look up.
+            scope: Identifies the request shape (format, headers, fields) the resources were fetched with.
+            
+        Returns:
+            Mapping of message ID to the `messages.get` response for the IDs found in the cache.
+        """
+        if not ids:
+            return {}
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            if self._conn is None:
+                return found
+            try:
+                # Stay well under SQLite's bound-parameter limit
+                for chunk in chunked(ids, 500):
+                    rows = self._conn.execute(
+                        f"SELECT id, message FROM raw_messages WHERE scope = ? AND id IN ({','.join('?' * len(chunk))})",
+                        [scope, *chunk]
+                    )
+                    for msg_id, blob in rows:
+                        found[msg_id] = loads(blob)
+            except (sqlite3.Error, ValueError) as e:
+                logger.error(f"Failed to read message cache: {e}")
+        return found
+
+    def put_messages(self, messages: Dict[str, Dict[str, Any]], scope: str) -> None:
+        """
+        Store raw message resources.
+        
+        Args:
+            messages: Mapping of message ID to the `messages.get` response.
+            scope: Identifies the request shape the resources were fetched with.
+        """
+        if not messages:
+            return
+        rows = [(msg_id, scope, dumps(message)) for msg_id, message in messages.items()]
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO raw_messages (id, scope, message) VALUES (?, ?, ?)", rows
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write message cache: {e}")
+
+    def get_classifications(self, items: List[Tuple[str, str, str]], scope: str) -> List[Optional[Tuple[str, float]]]:
+        """
+        Look up cached LLM results.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            scope: Identifies the model and prompt that produced the results; other scopes never match.
+            
+        Returns:
+            A (classification, confidence) tuple per item, or None where it is not cached.
+        """
+        results: List[Optional[Tuple[str, float]]] = [None] * len(items)
+        with self._lock:
+            if self._conn is None:
+                return results
+            try:
+                for i, item in enumerate(items):
+                    row = self._conn.execute(
+                        "SELECT classification, confidence FROM classifications WHERE key = ?", (_content_key(scope, *item),)
+                    ).fetchone()
+                    if row is not None:
+                        results[i] = (row[0], row[1])
+            except sqlite3.Error as e:
+                logger.error(f"Failed to read classification cache: {e}")
+        return results
+
+    def put_classifications(self, items: List[Tuple[str, str, str]], results: List[Tuple[str, float]],
+                            scope: str) -> None:
+        """
+        Store LLM results.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            results: The (classification, confidence) tuple for each item.
+            scope: Identifies the model and prompt that produced the results.
+        """
+        rows = [(_content_key(scope, *item), label, conf) for item, (label, conf) in zip(items, results)]
+        if not rows:
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO classifications (key, classification, confidence) VALUES (?, ?, ?)", rows
+                    )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to write classification cache: {e}")
@@ -2,16 +2,39 @@
 Email Classifier Logic.
 Determines safety of emails and decides on actions based on LLM classification and confidence scores.
 """
-from typing import Literal
+import bisect
+import functools
+import itertools
+import ahocorasick
+from typing import List, Literal, Optional, Tuple
 from .config import (
-    PROTECTED_DOMAINS, PROTECTED_KEYWORDS,
+    PROTECTED_DOMAIN_LABELS, PROTECTED_DOMAIN_SUFFIXES, PROTECTED_KEYWORDS_AC, PROTECTED_KEYWORDS_MIN_LEN,
     CONFIDENCE_ARCHIVE, CONFIDENCE_REVIEW
 )
 from .logger import logger
+from .utils import domain_of
 
 # Define a type alias for Actions
 ActionType = Literal["ARCHIVE", "REVIEW", "SKIP"]
 
+@functools.lru_cache(maxsize=4096)
+def is_protected_domain(domain: str) -> bool:
+    """
+    Check a (lowercased) sender domain against the protected TLDs and domains.
+    Protected TLDs match any whole label ('irs.gov', 'hmrc.gov.uk'); protected domains
+    match as a label-anchored suffix ('mail.google.com' yes, 'notgoogle.com' no).
+    Cached per domain, since the same senders repeat across a run.
+    
+    Args:
+        domain: The sender's domain.
+        
+    Returns:
+        True if the domain is protected, False otherwise.
+    """
+    if ('.' + domain).endswith(PROTECTED_DOMAIN_SUFFIXES):
+        return True
+    return not PROTECTED_DOMAIN_LABELS.isdisjoint(domain.split('.'))
+
 class Classifier:
     """
     Encapsulates logic for safety checks and action determination.
@@ -32,11 +55,10 @@ class Classifier:
         if not sender_email or '@' not in sender_email:
             return False
             
-        domain = sender_email.split('@')[-1].lower()
-        for protected in PROTECTED_DOMAINS:
-            if protected in domain:
-                logger.info(f"Safety Rule: Protected domain {domain} detected for {sender_email}")
-                return True
+        domain = domain_of(sender_email)
+        if is_protected_domain(domain):
+            logger.info(f"Safety Rule: Protected domain {domain} detected for {sender_email}")
+            return True
         return False
 
     def is_safe_content(self, subject: str, snippet: str) -> bool:
@@ -50,13 +72,46 @@ class Classifier:
         Returns:
             True if content is protected (should NOT be touched), False otherwise.
         """
+        # Empty or too short to hold any keyword: skip building and lowercasing the text
+        if len(subject) + 1 + len(snippet) < PROTECTED_KEYWORDS_MIN_LEN:
+            return False
+        if PROTECTED_KEYWORDS_AC.kind == ahocorasick.EMPTY:
+            return False
+
         text = (subject + " " + snippet).lower()
-        for keyword in PROTECTED_KEYWORDS:
-            if keyword in text:
-                logger.info(f"Safety Rule: Protected keyword '{keyword}' detected.")
-                return True
+        match = next(PROTECTED_KEYWORDS_AC.iter(text), None)
+        if match is not None:
+            _, keyword = match
+            logger.info(f"Safety Rule: Protected keyword '{keyword}' detected.")
+            return True
         return False
 
+    def match_protected_keywords(self, items: List[Tuple[str, str]]) -> List[Optional[str]]:
+        """
+        Screen a whole batch for protected keywords in a single automaton pass.
+        The lowercased texts are joined with NUL separators (which no keyword contains)
+        and each match is mapped back to its message by offset.
+        
+        Args:
+            items: List of (subject, snippet) pairs.
+            
+        Returns:
+            The first protected keyword found in each item, or None, in the same order as `items`.
+        """
+        if PROTECTED_KEYWORDS_AC.kind == ahocorasick.EMPTY:
+            return [None] * len(items)
+
+        texts = [(subject + " " + snippet).lower() for subject, snippet in items]
+        # Exclusive end offset of each text (plus its separator) within the joined string
+        ends = list(itertools.accumulate(len(text) + 1 for text in texts))
+        hits: List[Optional[str]] = [None] * len(texts)
+
+        for end, keyword in PROTECTED_KEYWORDS_AC.iter("\0".join(texts)):
+            index = bisect.bisect_right(ends, end)
+            if hits[index] is None:
+                hits[index] = keyword
+        return hits
+
     def determine_action(self, classification: str, confidence: float) -> ActionType:
         """
         Determine action based on classification and confidence.
@@ -3,7 +3,8 @@ Configuration settings for the Gmail Cleanup Agent.
 Defines constants, file paths, safety rules, and thresholds.
 """
 import os
-from typing import List, Final
+from typing import FrozenSet, List, Optional, Tuple, Final
+import ahocorasick
 
 # --- Paths ---
 BASE_DIR: Final[str] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -17,18 +18,60 @@ os.makedirs(LOGS_DIR, exist_ok=True)
 CREDENTIALS_FILE: Final[str] = os.path.join(BASE_DIR, 'credentials.json')
 TOKEN_FILE: Final[str] = os.path.join(BASE_DIR, 'token.json')
 SENDERS_FILE: Final[str] = os.path.join(DATA_DIR, 'senders.json')
+# SQLite cache of fetched message details and LLM results (safe to delete)
+CACHE_FILE: Final[str] = os.path.join(DATA_DIR, 'cache.sqlite3')
 LOG_FILE: Final[str] = os.path.join(LOGS_DIR, 'agent.log')
 
+# --- Logging ---
+# Rotate agent.log after this many bytes, keeping this many old files
+LOG_MAX_BYTES: int = 5 * 1024 * 1024
+LOG_BACKUP_COUNT: int = 3
+
+# File log records are buffered and written in batches of this size (errors flush immediately)
+LOG_BUFFER_CAPACITY: int = 1024
+
 # --- Gmail Settings ---
 SCOPES: Final[List[str]] = [
     'https://www.googleapis.com/auth/gmail.modify',
     'https://www.googleapis.com/auth/gmail.settings.basic'
 ]
 
+# Worker threads used when fetching messages concurrently
+GMAIL_MAX_WORKERS: int = 10
+
+# Retries (with exponential backoff) for rate-limited (429) or unavailable (5xx) API calls
+GMAIL_NUM_RETRIES: int = 5
+
+# Messages per listing page and per batch request. 100 is also Gmail's maximum; larger
+# batches gain nothing and risk 'request size exceeded' errors. Values above 100 are capped.
+GMAIL_BATCH_SIZE: int = 100
+
 # --- LLM Settings ---
 OLLAMA_MODEL: str = "llama3"
 OLLAMA_URL: str = "http://localhost:11434/api/generate"
 
+# Concurrent classification requests. Ollama only runs them in parallel when
+# started with OLLAMA_NUM_PARALLEL set to at least this value.
+LLM_MAX_WORKERS: int = 4
+
+# Emails packed into a single classification prompt (1 sends one prompt per email)
+LLM_PROMPT_BATCH_SIZE: int = 8
+
+# Seconds to wait for one email's classification (packed prompts scale this by batch size)
+LLM_TIMEOUT: int = 30
+
+# --- Local Classifier (optional) ---
+# Path or Hugging Face ID of a fine-tuned sequence-classification model. When set, it
+# classifies emails first and only low-confidence results are sent to the LLM.
+LOCAL_MODEL_PATH: Optional[str] = None
+
+# Emails per forward pass, and maximum tokens per email
+LOCAL_BATCH_SIZE: int = 64
+LOCAL_MAX_LENGTH: int = 256
+
+# Quantize the model's Linear layers to int8 when running on CPU
+LOCAL_QUANTIZE: bool = True
+
 # --- Thresholds ---
 # Confidence score required to archive an email automatically
 CONFIDENCE_ARCHIVE: float = 0.80
@@ -39,6 +82,12 @@ CONFIDENCE_REVIEW: float = 0.55
 # Number of times a sender must be classified as marketing to be "trusted"
 TRUSTED_SENDER_THRESHOLD: int = 3
 
+# Confidence assigned when a trusted sender's cached classification is reused instead of calling the LLM
+TRUSTED_SENDER_CONFIDENCE: float = 0.99
+
+# Write sender memory to disk after this many updates, so long runs lose little on a crash (0 = only at end of run)
+STORAGE_FLUSH_INTERVAL: int = 100
+
 # --- Runtime Flags ---
 # Default dry-run state (can be overridden by CLI args)
 DEFAULT_DRY_RUN: bool = False
@@ -53,9 +102,30 @@ PROTECTED_DOMAINS: Final[List[str]] = [
     "linkedin.com", "github.com", "gitlab.com"
 ]
 
+# Bare TLD entries ('gov', 'edu', 'mil') protect any domain that has them as a whole label,
+# so country-code forms like 'hmrc.gov.uk' and 'unimelb.edu.au' stay protected.
+PROTECTED_DOMAIN_LABELS: Final[FrozenSet[str]] = frozenset(d.lower() for d in PROTECTED_DOMAINS if '.' not in d)
+
+# Full domains are built once into a tuple for a single C-level str.endswith call. Each entry is
+# anchored on a label boundary ('.google.com') and matched against '.' + domain, so
+# 'mail.google.com' is protected but 'notgoogle.com' is not.
+PROTECTED_DOMAIN_SUFFIXES: Final[Tuple[str, ...]] = tuple('.' + d.lower() for d in PROTECTED_DOMAINS if '.' in d)
+
 # Emails containing these keywords in Subject/Snippet will NEVER be touched
 PROTECTED_KEYWORDS: Final[List[str]] = [
     "offer letter", "interview", "invoice", "payment", "receipt",
     "security alert", "verification code", "password reset",
     "tax", "legal", "contract", "agreement"
 ]
+
+# Matches every protected keyword in a single pass over the (lowercased) subject and snippet
+PROTECTED_KEYWORDS_AC: Final[ahocorasick.Automaton] = ahocorasick.Automaton()
+for _keyword in PROTECTED_KEYWORDS:
+    # Lowercased to match the lowercased text, so entries like "Offer Letter" still work
+    PROTECTED_KEYWORDS_AC.add_word(_keyword.lower(), _keyword)
+# An automaton with no words cannot be built or searched; classifier.py checks kind first
+if PROTECTED_KEYWORDS_AC.kind != ahocorasick.EMPTY:
+    PROTECTED_KEYWORDS_AC.make_automaton()
+
+# Text shorter than this cannot contain any protected keyword
+PROTECTED_KEYWORDS_MIN_LEN: Final[int] = min((len(k) for k in PROTECTED_KEYWORDS), default=0)
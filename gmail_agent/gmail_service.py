@@ -3,41 +3,148 @@ Gmail API Service Wrapper.
 Handles all interactions with the Google Gmail API, including listing messages,
 retrieving details, modifying labels, and creating filters.
 """
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional, Final, FrozenSet
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 from email.utils import parseaddr
 from .auth import authenticate_gmail
+from .cache import Cache
 from .logger import logger
-from .config import PROTECTED_DOMAINS
+from .models import MessageBatch
+from .utils import chunked, domain_of, loads
+from .classifier import is_protected_domain
+from .config import GMAIL_MAX_WORKERS, GMAIL_NUM_RETRIES, GMAIL_BATCH_SIZE
+
+# Calls per batch request: GMAIL_BATCH_SIZE, clamped to the 1..100 range Gmail accepts
+BATCH_LIMIT: Final[int] = max(1, min(GMAIL_BATCH_SIZE, 100))
+
+# Gmail accepts at most 1000 message IDs in a single batchModify call
+BATCH_MODIFY_LIMIT: Final[int] = 1000
+
+# The only headers the agent reads; fetched with format='metadata' to skip the MIME body
+METADATA_HEADERS: Final[List[str]] = ['Subject', 'From']
+
+# Partial-response mask: Gmail drops everything else (labelIds, sizeEstimate, ...) server-side
+MESSAGE_FIELDS: Final[str] = 'id,threadId,snippet,payload/headers'
+LIST_FIELDS: Final[str] = 'nextPageToken,messages(id,threadId)'
+
+# Cached raw messages are only reused when fetched with this same request shape
+MESSAGE_CACHE_SCOPE: Final[str] = f"metadata|{','.join(METADATA_HEADERS)}|{MESSAGE_FIELDS}"
+
+# 403 reasons Gmail uses for quota errors: the legacy error.errors[].reason values that
+# googleapiclient's num_retries retries, plus the google.rpc.ErrorInfo reason in error.details[]
+RATE_LIMIT_REASONS: Final[FrozenSet[str]] = frozenset({
+    'userRateLimitExceeded', 'rateLimitExceeded', 'RATE_LIMIT_EXCEEDED'
+})
+
+def _extract_address(sender: str) -> str:
+    """
+    Extract the email address from a From header.
+    Handles the common 'Name <addr>' and bare 'addr' shapes directly and only
+    falls back to the full RFC 2822 parser when that yields no usable address.
+    
+    Args:
+        sender: The raw From header value.
+        
+    Returns:
+        The email address, or an empty string if none could be parsed.
+    """
+    start, end = sender.rfind('<'), sender.rfind('>')
+    if start < end:
+        address = sender[start + 1:end].strip()
+    else:
+        address = sender.strip()
+
+    if '@' in address and ' ' not in address:
+        return address
+
+    _, address = parseaddr(sender)
+    return address
+
+def _is_retryable(error: HttpError) -> bool:
+    """
+    Check whether an API error is transient (rate limited or server-side).
+    
+    Args:
+        error: The HttpError raised by the API client.
+        
+    Returns:
+        True for 429 and 5xx responses and for 403 per-user rate-limit errors, False otherwise.
+    """
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status != 403:
+        return False
+    # Gmail reports quota exhaustion as 403 with a rate-limit reason in the JSON error body.
+    # error_details prefers "details" over "errors", so read the body itself.
+    try:
+        data = loads(error.content)
+        # Batch responses wrap the error object in a one-element list
+        error_body = (data[0] if isinstance(data, list) else data)['error']
+    except (ValueError, TypeError, KeyError, IndexError):
+        return False
+    if not isinstance(error_body, dict):
+        return False
+    # Same order as googleapiclient's retry check: legacy errors[] first, then ErrorInfo details[]
+    entries: List[Any] = []
+    for key in ('errors', 'details'):
+        value = error_body.get(key)
+        if isinstance(value, list):
+            entries.extend(value)
+    return any(
+        isinstance(entry, dict) and entry.get('reason') in RATE_LIMIT_REASONS
+        for entry in entries
+    )
 
 class GmailService:
     """
     Wrapper class for the Gmail API.
     """
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[Cache] = None) -> None:
         self.creds = authenticate_gmail()
         if not self.creds:
             raise RuntimeError("Failed to authenticate with Gmail.")
         self.service = build('gmail', 'v1', credentials=self.creds)
+        # httplib2.Http is not thread-safe, so each thread gets its own authorized instance
+        self._local = threading.local()
+        # Lowercased label name -> label ID, loaded lazily on first use
+        self._label_cache: Optional[Dict[str, str]] = None
+        # Optional on-disk cache of message details (content never changes once sent)
+        self.cache: Optional[Cache] = cache
 
-    def list_messages(self, query: str = "is:unread", max_results: int = 10) -> List[Dict[str, str]]:
+    def iter_messages(self, query: str = "is:unread", max_results: int = 10) -> Iterator[List[Dict[str, str]]]:
         """
-        List messages matching the query.
+        List messages matching the query, one page at a time.
+        Pages hold up to BATCH_LIMIT messages so each can be fetched with a single batch request
+        while the next page is still being listed.
         
         Args:
             query: Gmail search query (default: "is:unread").
-            max_results: Maximum number of messages to return.
+            max_results: Maximum total number of messages to return.
             
-        Returns:
-            List of message dictionaries containing 'id' and 'threadId'.
+        Yields:
+            Lists of message dictionaries containing 'id' and 'threadId'.
         """
+        messages_api = self.service.users().messages()
+        remaining = max_results
         try:
-            results = self.service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-            messages = results.get('messages', [])
-            return messages
+            request = messages_api.list(
+                userId='me', q=query, maxResults=min(BATCH_LIMIT, max_results), fields=LIST_FIELDS
+            )
+            while request is not None and remaining > 0:
+                response = request.execute(http=self._thread_http(), num_retries=GMAIL_NUM_RETRIES)
+                page = response.get('messages', [])[:remaining]
+                if page:
+                    remaining -= len(page)
+                    yield page
+                request = messages_api.list_next(request, response)
         except Exception as e:
             logger.error(f"An error occurred listing messages: {e}")
-            return []
 
     def get_message_details(self, msg_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -49,29 +156,146 @@ class GmailService:
         Returns:
             Dictionary with subject, sender, email_address, snippet, etc., or None if failed.
         """
+        message = self._get_raw_message(msg_id)
+        if message is None:
+            return None
         try:
-            message = self.service.users().messages().get(userId='me', id=msg_id, format='full').execute()
-            headers = message['payload']['headers']
-            
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), "No Subject")
-            sender = next((h['value'] for h in headers if h['name'] == 'From'), "Unknown")
-            snippet = message.get('snippet', '')
-            
-            # Extract email address from sender
-            _, email_address = parseaddr(sender)
+            return self._parse_message(msg_id, message)
+        except Exception as e:
+            logger.error(f"Failed to parse message {msg_id}: {e}")
+            return None
+
+    def _get_raw_message(self, msg_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Helper to fetch one message resource, retrying transient failures with backoff.
+        
+        Args:
+            msg_id: The ID of the message to retrieve.
             
-            return {
-                'id': msg_id,
-                'subject': subject,
-                'sender': sender,
-                'email_address': email_address,
-                'snippet': snippet,
-                'threadId': message['threadId']
-            }
+        Returns:
+            The `messages.get` response, or None if failed.
+        """
+        try:
+            return self.service.users().messages().get(
+                userId='me', id=msg_id, format='metadata', metadataHeaders=METADATA_HEADERS,
+                fields=MESSAGE_FIELDS
+            ).execute(http=self._thread_http(), num_retries=GMAIL_NUM_RETRIES)
         except Exception as e:
             logger.error(f"An error occurred getting message details for {msg_id}: {e}")
             return None
 
+    def get_messages_parallel(self, ids: List[str], max_workers: int = GMAIL_MAX_WORKERS) -> List[Optional[Dict[str, Any]]]:
+        """
+        Get details for many messages using concurrent requests.
+        Overlaps the network round trips of individual `messages.get` calls.
+        
+        Args:
+            ids: The IDs of the messages to retrieve.
+            max_workers: Number of concurrent requests.
+            
+        Returns:
+            List of message details in the same order as `ids` (None for failures).
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.get_message_details, ids))
+
+    def get_message_details_batch(self, ids: List[str]) -> MessageBatch:
+        """
+        Get details for many messages using Gmail's HTTP batch endpoint.
+        Sends up to BATCH_LIMIT `messages.get` calls per HTTP request instead of one request per message.
+        Messages whose batch entry failed with a retryable error (429/5xx) are fetched again
+        individually, with backoff, on GMAIL_MAX_WORKERS threads.
+        Duplicate IDs are fetched once, and IDs found in `self.cache` are not fetched at all.
+        The cache holds the raw responses, which are parsed on every run.
+        
+        Args:
+            ids: The IDs of the messages to retrieve.
+            
+        Returns:
+            The messages as a columnar batch, in the same order as `ids`. Messages that failed to load are omitted.
+        """
+        ids = list(dict.fromkeys(ids))
+        cached = self.cache.get_messages(ids, MESSAGE_CACHE_SCOPE) if self.cache else {}
+        if cached:
+            logger.info(f"Loaded {len(cached)} of {len(ids)} messages from cache")
+        fetched: Dict[str, Dict[str, Any]] = {}
+        retry_ids: List[str] = []
+
+        def callback(request_id: str, response: Dict[str, Any], exception: Optional[Exception]) -> None:
+            if exception is not None:
+                if isinstance(exception, HttpError) and _is_retryable(exception):
+                    retry_ids.append(request_id)
+                else:
+                    logger.error(f"An error occurred getting message details for {request_id}: {exception}")
+                return
+            fetched[request_id] = response
+
+        for chunk in chunked([msg_id for msg_id in ids if msg_id not in cached], BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=callback)
+            for msg_id in chunk:
+                batch.add(
+                    self.service.users().messages().get(
+                        userId='me', id=msg_id, format='metadata', metadataHeaders=METADATA_HEADERS,
+                        fields=MESSAGE_FIELDS
+                    ),
+                    request_id=msg_id
+                )
+            try:
+                batch.execute(http=self._thread_http())
+            except Exception as e:
+                logger.error(f"An error occurred executing batch request: {e}")
+                retry_ids.extend(msg_id for msg_id in chunk if msg_id not in fetched and msg_id not in retry_ids)
+
+        if retry_ids:
+            logger.warning(f"Retrying {len(retry_ids)} messages individually after batch errors")
+            with ThreadPoolExecutor(max_workers=GMAIL_MAX_WORKERS) as executor:
+                for msg_id, message in zip(retry_ids, executor.map(self._get_raw_message, retry_ids)):
+                    if message is not None:
+                        fetched[msg_id] = message
+
+        if self.cache:
+            self.cache.put_messages(fetched, MESSAGE_CACHE_SCOPE)
+
+        details_list: List[Dict[str, Any]] = []
+        for msg_id in ids:
+            message = cached.get(msg_id) or fetched.get(msg_id)
+            if message is None:
+                continue
+            try:
+                details_list.append(self._parse_message(msg_id, message))
+            except Exception as e:
+                logger.error(f"Failed to parse message {msg_id}: {e}")
+        return MessageBatch.from_details(details_list)
+
+    def _parse_message(self, msg_id: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Helper to extract the fields used by the agent from a raw Gmail message resource.
+        
+        Args:
+            msg_id: The ID of the message.
+            message: The message resource returned by `messages.get`.
+            
+        Returns:
+            Dictionary with subject, sender, email_address, snippet and threadId.
+        """
+        headers = {h['name']: h['value'] for h in message['payload']['headers']}
+        
+        subject = headers.get('Subject', "No Subject")
+        sender = headers.get('From', "Unknown")
+        snippet = message.get('snippet', '')
+        
+        # Extract email address from sender, normalized so sender memory keys on one spelling
+        email_address = _extract_address(sender).lower()
+        
+        return {
+            'id': msg_id,
+            'subject': subject,
+            'sender': sender,
+            'email_address': email_address,
+            'snippet': snippet,
+            'threadId': message['threadId']
+        }
+
     def add_label(self, msg_id: str, label_name: str) -> None:
         """
         Add a label to a message. Creates the label if it doesn't exist.
@@ -89,6 +313,11 @@ class GmailService:
             }
             self.service.users().messages().modify(userId='me', id=msg_id, body=body).execute()
             logger.info(f"Added label {label_name} to message {msg_id}")
+        except HttpError as e:
+            if e.resp.status == 404:
+                # The cached label may have been deleted outside the agent
+                self._label_cache = None
+            logger.error(f"Failed to add label {label_name} to {msg_id}: {e}")
         except Exception as e:
             logger.error(f"Failed to add label {label_name} to {msg_id}: {e}")
 
@@ -108,6 +337,69 @@ class GmailService:
         except Exception as e:
             logger.error(f"Failed to archive message {msg_id}: {e}")
 
+    def batch_modify(self, msg_ids: List[str], label_name: str, archive: bool = False) -> None:
+        """
+        Add a label to (and optionally archive) many messages with `messages.batchModify`.
+        Creates the label if it doesn't exist.
+        
+        Args:
+            msg_ids: The IDs of the messages.
+            label_name: The name of the label to add.
+            archive: Whether to also remove the 'INBOX' label.
+        """
+        remove_label_ids = ['INBOX'] if archive else []
+        label_id: Optional[str] = None
+
+        # Each chunk is its own request, so one failure does not drop the chunks after it
+        for chunk in chunked(msg_ids, BATCH_MODIFY_LIMIT):
+            # A 400/404 may mean the cached label was deleted outside the agent: refresh and retry once
+            for attempt in range(2):
+                try:
+                    if label_id is None:
+                        label_id = self._get_or_create_label_id(label_name)
+                    body = {
+                        'ids': chunk,
+                        'addLabelIds': [label_id],
+                        'removeLabelIds': remove_label_ids
+                    }
+                    self.service.users().messages().batchModify(userId='me', body=body).execute()
+                    logger.info(f"Added label {label_name} to {len(chunk)} messages (archive: {archive})")
+                except HttpError as e:
+                    if e.resp.status in (400, 404) and attempt == 0:
+                        logger.warning(f"Label {label_name} looks stale ({e.resp.status}); refreshing and retrying")
+                        self._label_cache = None
+                        label_id = None
+                        continue
+                    logger.error(f"Failed to batch modify {len(chunk)} messages with label {label_name}: {e}")
+                except Exception as e:
+                    logger.error(f"Failed to batch modify {len(chunk)} messages with label {label_name}: {e}")
+                break
+
+    def _thread_http(self) -> AuthorizedHttp:
+        """
+        Helper to get the authorized HTTP object owned by the current thread.
+        
+        Returns:
+            An AuthorizedHttp instance safe to use from this thread only.
+        """
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            http = AuthorizedHttp(self.creds, http=build_http())
+            self._local.http = http
+        return http
+
+    def _refresh_label_cache(self) -> Dict[str, str]:
+        """
+        Helper to load the user's labels once and cache them by lowercased name.
+        
+        Returns:
+            The refreshed label cache.
+        """
+        results = self.service.users().labels().list(userId='me').execute()
+        labels = results.get('labels', [])
+        self._label_cache = {label['name'].lower(): label['id'] for label in labels}
+        return self._label_cache
+
     def _get_or_create_label_id(self, label_name: str) -> str:
         """
         Helper to get label ID by name, or create it if missing.
@@ -119,15 +411,18 @@ class GmailService:
             The Label ID string.
         """
         try:
-            results = self.service.users().labels().list(userId='me').execute()
-            labels = results.get('labels', [])
-            for label in labels:
-                if label['name'].lower() == label_name.lower():
-                    return label['id']
+            cache = self._label_cache
+            if cache is None:
+                cache = self._refresh_label_cache()
+
+            label_id = cache.get(label_name.lower())
+            if label_id is not None:
+                return label_id
             
             # Create if not found
             label_object = {'name': label_name}
             created_label = self.service.users().labels().create(userId='me', body=label_object).execute()
+            cache[label_name.lower()] = created_label['id']
             return created_label['id']
         except Exception as e:
             logger.error(f"Error getting/creating label {label_name}: {e}")
@@ -142,8 +437,8 @@ class GmailService:
             label_name: The label to apply.
         """
         # Safety check
-        domain = sender_email.split('@')[-1]
-        if any(protected in domain for protected in PROTECTED_DOMAINS):
+        domain = domain_of(sender_email)
+        if is_protected_domain(domain):
             logger.warning(f"Attempted to create filter for protected domain {domain}. Aborted.")
             return
 
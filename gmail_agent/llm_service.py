@@ -3,18 +3,102 @@ LLM Service Wrapper.
 Handles interactions with the local Ollama instance for email classification.
 """
 import requests
+from requests.adapters import HTTPAdapter
 import json
-from typing import Tuple, Dict, Any
-from .config import OLLAMA_URL, OLLAMA_MODEL
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Dict, Any, List, Optional, FrozenSet
+from .config import OLLAMA_URL, OLLAMA_MODEL, LLM_MAX_WORKERS, LLM_PROMPT_BATCH_SIZE, LLM_TIMEOUT
+from .cache import Cache
 from .logger import logger
+from .utils import chunked
+
+# Labels the model may return; anything else is treated as a failed classification
+VALID_CATEGORIES: FrozenSet[str] = frozenset({"NEWSLETTER", "PROMOTION", "OUTREACH", "COURSE", "IMPORTANT"})
+
+# Part of the classification cache key; bump it whenever the prompts below change
+PROMPT_VERSION: int = 1
+
+# Built once at import. The instructions form a fixed prefix that Ollama can reuse
+# from its prompt cache; only the per-email fields at the end change between calls.
+_CATEGORIES: str = """- NEWSLETTER
+- PROMOTION
+- OUTREACH
+- COURSE
+- IMPORTANT (Personal, Work, Bills, Legal, Medical, etc.)
+"""
+
+_PROMPT_TEMPLATE: str = """
+You are an email classifier. Classify the following email into one of these categories:
+""" + _CATEGORIES + """
+Sender: {sender}
+Subject: {subject}
+Snippet: {snippet}
+
+Respond with JSON only:
+{{
+    "classification": "CATEGORY",
+    "confidence": 0.0 to 1.0
+}}
+"""
+
+# Several emails in one prompt; each is numbered so results can be matched back by index
+_BATCH_PROMPT_TEMPLATE: str = """
+You are an email classifier. Classify each of the following emails into one of these categories:
+""" + _CATEGORIES + """
+EMAILS:
+{emails}
+Respond with JSON only, with one result per email using its number as "index":
+{{
+    "results": [
+        {{"index": 1, "classification": "CATEGORY", "confidence": 0.0 to 1.0}}
+    ]
+}}
+"""
+
+_BATCH_ITEM_TEMPLATE: str = """[{index}]
+Sender: {sender}
+Subject: {subject}
+Snippet: {snippet}
+"""
+
+def _parse_result(generation: Dict[str, Any]) -> Tuple[str, float]:
+    """
+    Read one classification from the model's JSON output.
+    
+    Args:
+        generation: An object with 'classification' and 'confidence' keys.
+        
+    Returns:
+        The (classification, confidence) tuple, or ("IMPORTANT", 0.0) if the label is
+        missing or not one of VALID_CATEGORIES or the confidence is not a number.
+    """
+    classification = generation.get('classification')
+    if not isinstance(classification, str) or classification.upper() not in VALID_CATEGORIES:
+        logger.warning(f"LLM returned unknown classification {classification!r}")
+        return "IMPORTANT", 0.0
+    try:
+        confidence = float(generation.get('confidence', 0.0))
+    except (TypeError, ValueError):
+        logger.warning(f"LLM returned invalid confidence {generation.get('confidence')!r}")
+        return "IMPORTANT", 0.0
+    return classification.upper(), confidence
 
 class LLMService:
     """
     Service for interacting with the local LLM (Ollama).
     """
-    def __init__(self) -> None:
+    def __init__(self, cache: Optional[Cache] = None) -> None:
         self.url: str = OLLAMA_URL
         self.model: str = OLLAMA_MODEL
+        # Keep-alive session so every classification reuses pooled connections to Ollama
+        self.session: requests.Session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Content-Type': 'application/json'})
+        # Optional on-disk cache of results keyed by email content, model and prompt version
+        self.cache: Optional[Cache] = cache
+        self._cache_scope: str = f"{self.model}:{PROMPT_VERSION}"
 
     def classify_email(self, subject: str, snippet: str, sender: str) -> Tuple[str, float]:
         """
@@ -30,45 +114,11 @@ class LLMService:
             - classification (str): The category (e.g., 'NEWSLETTER', 'IMPORTANT').
             - confidence (float): A score between 0.0 and 1.0.
         """
-        prompt = f"""
-        You are an email classifier. Classify the following email into one of these categories:
-        - NEWSLETTER
-        - PROMOTION
-        - OUTREACH
-        - COURSE
-        - IMPORTANT (Personal, Work, Bills, Legal, Medical, etc.)
-
-        Sender: {sender}
-        Subject: {subject}
-        Snippet: {snippet}
-
-        Respond with JSON only:
-        {{
-            "classification": "CATEGORY",
-            "confidence": 0.0 to 1.0
-        }}
-        """
-
-        payload: Dict[str, Any] = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": False,
-            "format": "json"
-        }
+        prompt = _PROMPT_TEMPLATE.format(sender=sender, subject=subject, snippet=snippet)
 
         try:
-            response = requests.post(self.url, json=payload, timeout=30) # Added timeout
-            response.raise_for_status()
-            result = response.json()
-            
-            # Parse the 'response' field which contains the actual generation
-            # Ollama 'json' format mode usually guarantees valid JSON in 'response'
-            generation = json.loads(result['response'])
-            
-            classification = generation.get('classification', 'IMPORTANT').upper()
-            confidence = float(generation.get('confidence', 0.0))
-            
-            return classification, confidence
+            generation = self._generate(prompt, LLM_TIMEOUT)
+            return _parse_result(generation)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"LLM connection failed: {e}")
@@ -79,3 +129,148 @@ class LLMService:
         except Exception as e:
             logger.error(f"LLM unexpected error: {e}")
             return "IMPORTANT", 0.0
+
+    def classify_emails_batch(self, items: List[Tuple[str, str, str]],
+                              batch_size: int = LLM_PROMPT_BATCH_SIZE) -> List[Tuple[str, float]]:
+        """
+        Classify many emails, packing up to `batch_size` of them into each prompt.
+        Prompts are sent concurrently; any email missing from a response is classified on its own.
+        Emails already in `self.cache` are not sent to the LLM.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            batch_size: Emails per prompt (1 disables packing).
+            
+        Returns:
+            List of (classification, confidence) tuples in the same order as `items`.
+        """
+        if not self.cache:
+            return self._classify_packed(items, batch_size)
+
+        results = self.cache.get_classifications(items, self._cache_scope)
+        misses = [i for i, result in enumerate(results) if result is None]
+        if len(misses) < len(items):
+            logger.info(f"Loaded {len(items) - len(misses)} of {len(items)} classifications from cache")
+        if misses:
+            fresh = self._classify_packed([items[i] for i in misses], batch_size)
+            # Failures come back as confidence 0.0; leave those uncached so they are retried next run
+            self.cache.put_classifications(
+                [items[i] for i, result in zip(misses, fresh) if result[1] > 0.0],
+                [result for result in fresh if result[1] > 0.0],
+                self._cache_scope
+            )
+            for i, result in zip(misses, fresh):
+                results[i] = result
+
+        return [result for result in results if result is not None]
+
+    def _classify_packed(self, items: List[Tuple[str, str, str]], batch_size: int) -> List[Tuple[str, float]]:
+        """
+        Helper for `classify_emails_batch` that always asks the LLM.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            batch_size: Emails per prompt (1 disables packing).
+            
+        Returns:
+            List of (classification, confidence) tuples in the same order as `items`.
+        """
+        if batch_size <= 1 or len(items) <= 1:
+            return self.classify_batch(items)
+
+        groups = list(chunked(items, batch_size))
+        with ThreadPoolExecutor(max_workers=LLM_MAX_WORKERS) as executor:
+            group_results = list(executor.map(self._classify_group, groups))
+
+        results: List[Optional[Tuple[str, float]]] = [r for group in group_results for r in group]
+
+        # Fall back to one prompt per email for anything the packed prompts did not return
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            logger.warning(f"LLM batch missed {len(missing)} of {len(items)} emails; classifying them individually")
+            for i, result in zip(missing, self.classify_batch([items[i] for i in missing])):
+                results[i] = result
+
+        return [result for result in results if result is not None]
+
+    def _classify_group(self, group: List[Tuple[str, str, str]]) -> List[Optional[Tuple[str, float]]]:
+        """
+        Helper to classify a group of emails with a single packed prompt.
+        
+        Args:
+            group: List of (subject, snippet, sender) tuples.
+            
+        Returns:
+            A (classification, confidence) tuple per email, or None where the response had no valid entry.
+        """
+        emails = "".join(
+            _BATCH_ITEM_TEMPLATE.format(index=n, sender=sender, subject=subject, snippet=snippet)
+            for n, (subject, snippet, sender) in enumerate(group, start=1)
+        )
+        prompt = _BATCH_PROMPT_TEMPLATE.format(emails=emails)
+        results: List[Optional[Tuple[str, float]]] = [None] * len(group)
+
+        try:
+            generation = self._generate(prompt, LLM_TIMEOUT * len(group))
+            entries = generation.get('results', [])
+            indices = [int(entry['index']) for entry in entries]
+        except Exception as e:
+            logger.error(f"LLM batch classification failed: {e}")
+            return results
+
+        # Only trust the response if it numbers every email 1..n exactly once; anything
+        # else (e.g. numbering from 0) could shift labels onto the wrong emails
+        if sorted(indices) != list(range(1, len(group) + 1)):
+            logger.warning(f"LLM batch returned indices {sorted(indices)} for {len(group)} emails; discarding it")
+            return results
+
+        for index, entry in zip(indices, entries):
+            results[index - 1] = _parse_result(entry)
+        return results
+
+    def _generate(self, prompt: str, timeout: float) -> Dict[str, Any]:
+        """
+        Helper to run a prompt through Ollama in JSON mode.
+        
+        Args:
+            prompt: The full prompt.
+            timeout: Request timeout in seconds.
+            
+        Returns:
+            The parsed JSON object generated by the model.
+            
+        Raises:
+            requests.exceptions.RequestException: If the request fails.
+            json.JSONDecodeError: If the model output is not valid JSON.
+        """
+        payload: Dict[str, Any] = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "format": "json"
+        }
+
+        response = self.session.post(self.url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        result = response.json()
+        
+        # Parse the 'response' field which contains the actual generation
+        # Ollama 'json' format mode usually guarantees valid JSON in 'response'
+        return json.loads(result['response'])
+
+    def classify_batch(self, items: List[Tuple[str, str, str]], max_workers: int = LLM_MAX_WORKERS) -> List[Tuple[str, float]]:
+        """
+        Classify many emails concurrently.
+        Requires Ollama to be started with OLLAMA_NUM_PARALLEL >= max_workers to run them in parallel.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            max_workers: Number of concurrent requests to Ollama.
+            
+        Returns:
+            List of (classification, confidence) tuples in the same order as `items`.
+        """
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(lambda item: self.classify_email(*item), items))
@@ -0,0 +1,75 @@
+"""
+Local Classifier.
+Runs a fine-tuned sequence-classification model (e.g. DistilBERT, MiniLM) in-process
+as a fast first stage before the LLM. Requires the optional `torch` and `transformers` packages.
+"""
+from typing import List, Optional, Tuple
+from .config import LOCAL_MODEL_PATH, LOCAL_BATCH_SIZE, LOCAL_MAX_LENGTH, LOCAL_QUANTIZE
+from .llm_service import VALID_CATEGORIES
+from .logger import logger
+from .utils import chunked
+
+try:
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+except ImportError:  # Optional dependency; LocalClassifier is disabled without it
+    torch = None  # type: ignore[assignment]
+
+class LocalClassifier:
+    """
+    Classifies emails with a local Hugging Face model.
+    The model's id2label names must match the LLM categories (NEWSLETTER, PROMOTION, ...).
+    """
+    def __init__(self, model_path: Optional[str] = LOCAL_MODEL_PATH) -> None:
+        if torch is None:
+            raise RuntimeError("LocalClassifier requires 'torch' and 'transformers' (pip install torch transformers).")
+        if not model_path:
+            raise RuntimeError("LocalClassifier requires a model path (set LOCAL_MODEL_PATH in config.py).")
+
+        self.device: str = 'cuda' if torch.cuda.is_available() else 'cpu'
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path)
+        model = AutoModelForSequenceClassification.from_pretrained(model_path)
+        model.eval()
+        if self.device == 'cuda':
+            model = model.half()
+        elif LOCAL_QUANTIZE:
+            # int8 dynamic quantization of the Linear layers: less memory traffic per matmul on CPU
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model.to(self.device)
+        self.labels: List[str] = [model.config.id2label[i].upper() for i in range(model.config.num_labels)]
+        # A model that was not fine-tuned for this task has generic names (LABEL_0, ...) that
+        # would otherwise be applied as Gmail labels
+        unknown = sorted(set(self.labels) - VALID_CATEGORIES)
+        if unknown:
+            raise RuntimeError(
+                f"Local model {model_path} has labels {unknown} that are not LLM categories {sorted(VALID_CATEGORIES)}."
+            )
+        logger.info(f"Loaded local classifier from {model_path} on {self.device}")
+
+    def classify_batch(self, items: List[Tuple[str, str, str]]) -> List[Tuple[str, float]]:
+        """
+        Classify many emails in batched forward passes.
+        
+        Args:
+            items: List of (subject, snippet, sender) tuples.
+            
+        Returns:
+            List of (classification, confidence) tuples in the same order as `items`.
+        """
+        texts = [f"From: {sender}\nSubject: {subject}\n{snippet}" for subject, snippet, sender in items]
+        results: List[Tuple[str, float]] = []
+
+        for chunk in chunked(texts, LOCAL_BATCH_SIZE):
+            inputs = self.tokenizer(
+                chunk, padding=True, truncation=True,
+                max_length=LOCAL_MAX_LENGTH, return_tensors='pt'
+            ).to(self.device)
+            with torch.inference_mode():
+                logits = self.model(**inputs).logits
+            confidences, indices = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+            results.extend(
+                (self.labels[index], float(confidence))
+                for index, confidence in zip(indices.tolist(), confidences.tolist())
+            )
+
+        return results
@@ -2,20 +2,29 @@
 Logging configuration for the Gmail Cleanup Agent.
 Provides structured JSON logging for machine parsing and human-readable console output.
 """
+import atexit
 import logging
-import json
+import logging.handlers
 import os
-from datetime import datetime
-from typing import Any, Dict
-from .config import LOG_FILE
+import queue
+import time
+from typing import Any, Dict, List, Optional
+from .config import LOG_FILE, LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_BUFFER_CAPACITY
+from .utils import dumps
 
 class JsonFormatter(logging.Formatter):
     """
     Formatter to output logs as JSON objects for easier parsing and observability.
     """
+    def __init__(self, datefmt: Optional[str] = None) -> None:
+        super().__init__()
+        # ISO 8601 local time; milliseconds are appended from record.msecs
+        self._datefmt: str = datefmt or '%Y-%m-%dT%H:%M:%S'
+
     def format(self, record: logging.LogRecord) -> str:
+        timestamp = time.strftime(self._datefmt, time.localtime(record.created))
         log_record: Dict[str, Any] = {
-            "timestamp": datetime.fromtimestamp(record.created).isoformat(),
+            "timestamp": f"{timestamp}.{int(record.msecs):03d}",
             "level": record.levelname,
             "message": record.getMessage(),
             "module": record.module,
@@ -25,13 +34,19 @@ class JsonFormatter(logging.Formatter):
         if hasattr(record, 'props'):
             log_record.update(record.props)  # type: ignore
         
-        return json.dumps(log_record)
+        return dumps(log_record).decode('utf-8')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
 
 def setup_logger() -> logging.Logger:
     """
     Configures and returns the application logger.
-    Logs are written to a file in JSON format and to the console in text format.
+    Logs are written to a rotating file in JSON format and to the console in text format.
+    Records are handed to a background thread through a queue, so formatting and
+    writing happen off the calling thread.
     """
+    global _listener, _queue_handler
     logger = logging.getLogger("GmailAgent")
     logger.setLevel(logging.INFO)
     
@@ -39,20 +54,54 @@ def setup_logger() -> logging.Logger:
     if logger.hasHandlers():
         return logger
 
-    # File Handler (JSON)
+    handlers: List[logging.Handler] = []
+
+    # File Handler (JSON), rotated and buffered so records are written in batches
     try:
-        file_handler = logging.FileHandler(LOG_FILE)
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
+        )
         file_handler.setFormatter(JsonFormatter())
-        logger.addHandler(file_handler)
+        memory_handler = logging.handlers.MemoryHandler(
+            capacity=LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler
+        )
+        handlers.append(memory_handler)
+        atexit.register(memory_handler.flush)
     except Exception as e:
         print(f"Failed to setup file logging: {e}")
 
     # Console Handler (Human readable)
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
+
+    # The logger only enqueues; the listener thread formats and writes to the handlers
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    logger.addHandler(_queue_handler)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Registered after memory_handler.flush, so it runs first (atexit is LIFO)
+    atexit.register(stop_logging)
 
     return logger
 
+def stop_logging() -> None:
+    """
+    Stop the background listener after it has written every queued record.
+    Later records (e.g. from atexit flushes) go straight to the file and console handlers.
+    Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        app_logger = logging.getLogger("GmailAgent")
+        if _queue_handler is not None:
+            app_logger.removeHandler(_queue_handler)
+        for handler in _listener.handlers:
+            app_logger.addHandler(handler)
+        _listener = None
+        _queue_handler = None
+
 # Singleton logger instance
 logger = setup_logger()
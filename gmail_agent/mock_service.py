@@ -1,5 +1,6 @@
-from typing import List, Dict, Any, Optional
+from typing import Iterator, List, Dict, Any, Optional
 from .logger import logger
+from .models import MessageBatch
 
 class MockGmailService:
     """
@@ -9,17 +10,19 @@ class MockGmailService:
     def __init__(self):
         logger.info("Initialized MockGmailService")
 
-    def list_messages(self, query: str = "is:unread", max_results: int = 10) -> List[Dict[str, str]]:
-        """Returns a list of dummy message IDs."""
+    def iter_messages(self, query: str = "is:unread", max_results: int = 10) -> Iterator[List[Dict[str, str]]]:
+        """Yields a single page of dummy message IDs."""
         logger.info(f"[MOCK] Listing messages with query='{query}' limit={max_results}")
         # Return some fake message IDs
-        return [
+        messages = [
             {'id': 'mock_msg_1', 'threadId': 'mock_thread_1'},
             {'id': 'mock_msg_2', 'threadId': 'mock_thread_2'},
             {'id': 'mock_msg_3', 'threadId': 'mock_thread_3'},
             {'id': 'mock_msg_4', 'threadId': 'mock_thread_4'},
             {'id': 'mock_msg_5', 'threadId': 'mock_thread_5'},
-        ]
+        ][:max_results]
+        if messages:
+            yield messages
 
     def get_message_details(self, msg_id: str) -> Optional[Dict[str, Any]]:
         """Returns fake details for a message ID."""
@@ -75,11 +78,24 @@ class MockGmailService:
             'threadId': f"thread_{msg_id}"
         }
 
+    def get_messages_parallel(self, ids: List[str], max_workers: int = 10) -> List[Optional[Dict[str, Any]]]:
+        """Returns fake details for a list of message IDs, in order."""
+        logger.info(f"[MOCK] Parallel getting details for {len(ids)} messages with {max_workers} workers")
+        return [self.get_message_details(msg_id) for msg_id in ids]
+
+    def get_message_details_batch(self, ids: List[str]) -> MessageBatch:
+        """Returns fake details for a list of message IDs, in order."""
+        logger.info(f"[MOCK] Batch getting details for {len(ids)} messages")
+        return MessageBatch.from_details(details for details in map(self.get_message_details, ids) if details)
+
     def add_label(self, msg_id: str, label_name: str) -> None:
         logger.info(f"[MOCK] Added label '{label_name}' to {msg_id}")
 
     def archive_message(self, msg_id: str) -> None:
         logger.info(f"[MOCK] Archived message {msg_id}")
 
+    def batch_modify(self, msg_ids: List[str], label_name: str, archive: bool = False) -> None:
+        logger.info(f"[MOCK] Added label '{label_name}' to {len(msg_ids)} messages (archive: {archive})")
+
     def create_filter(self, sender_email: str, label_name: str) -> None:
         logger.info(f"[MOCK] Created filter: From {sender_email} -> Label {label_name}")
@@ -0,0 +1,38 @@
+"""
+Data models shared between pipeline stages.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List
+
+@dataclass
+class MessageBatch:
+    """
+    A batch of fetched messages stored column by column (struct of arrays).
+    Index i of every list describes the same message.
+    Only the columns the pipeline reads are kept; `process_batch` screens whole columns,
+    while the per-sender, classify and action steps still look up items by index.
+    """
+    ids: List[str] = field(default_factory=list)
+    senders: List[str] = field(default_factory=list)
+    email_addresses: List[str] = field(default_factory=list)
+    subjects: List[str] = field(default_factory=list)
+    snippets: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, details: Dict[str, Any]) -> None:
+        """Adds one message, given as a details dict from `get_message_details`."""
+        self.ids.append(details['id'])
+        self.senders.append(details['sender'])
+        self.email_addresses.append(details['email_address'])
+        self.subjects.append(details['subject'])
+        self.snippets.append(details['snippet'])
+
+    @classmethod
+    def from_details(cls, details_list: Iterable[Dict[str, Any]]) -> "MessageBatch":
+        """Builds a batch from message details dicts, keeping their order."""
+        batch = cls()
+        for details in details_list:
+            batch.append(details)
+        return batch
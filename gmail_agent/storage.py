@@ -1,45 +1,76 @@
 """
 Persistent storage management for the Gmail Cleanup Agent.
 Handles reading/writing sender data to JSON and tracking classification history.
+Updates are kept in memory and written by `flush()` (end of run, or every STORAGE_FLUSH_INTERVAL updates).
 """
+import atexit
 import json
 import os
+import tempfile
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional, List, Final
-from .config import SENDERS_FILE, TRUSTED_SENDER_THRESHOLD
+from typing import Dict, Any, Optional, FrozenSet, Final
+from .config import SENDERS_FILE, TRUSTED_SENDER_THRESHOLD, STORAGE_FLUSH_INTERVAL
 from .logger import logger
+from .utils import domain_of, dumps, loads
 
-MARKETING_TYPES: Final[List[str]] = ["NEWSLETTER", "PROMOTION", "COURSE", "OUTREACH"]
+MARKETING_TYPES: Final[FrozenSet[str]] = frozenset({"NEWSLETTER", "PROMOTION", "COURSE", "OUTREACH"})
 
 class Storage:
     """
     Manages persistent storage for sender memory.
-    Data is saved to a JSON file defined in config.SENDERS_FILE.
+    Data is saved to a JSON file defined in config.SENDERS_FILE, or to `path` if given.
+    Passing `data` starts from that dict instead of reading the file; without a `path`
+    such a Storage is memory-only (e.g. for tests) and never writes to disk.
     """
     
-    def __init__(self) -> None:
-        self.file_path: str = SENDERS_FILE
-        self.data: Dict[str, Any] = self._load_data()
+    def __init__(self, path: Optional[str] = None, data: Optional[Dict[str, Any]] = None) -> None:
+        self.file_path: Optional[str] = path if data is not None else (path or SENDERS_FILE)
+        self.data: Dict[str, Any] = data if data is not None else self._load_data()
+        self._dirty: bool = False
+        self._updates_since_flush: int = 0
+        # Guards self.data; re-entrant because update_sender may flush while holding it
+        self._lock = threading.RLock()
+        # Safety net in case the caller never flushes
+        atexit.register(self.flush)
 
     def _load_data(self) -> Dict[str, Any]:
         """Loads sender data from JSON file. Returns empty dict if file doesn't exist or is corrupt."""
-        if not os.path.exists(self.file_path):
+        if self.file_path is None or not os.path.exists(self.file_path):
             return {}
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(self.file_path, 'rb') as f:
+                return loads(f.read())
         except (json.JSONDecodeError, IOError) as e:
             logger.error(f"Failed to load storage from {self.file_path}: {e}")
             return {}
 
-    def _save_data(self) -> None:
-        """Saves current memory to JSON file."""
+    def _save_data(self) -> bool:
+        """Saves current memory to JSON file atomically (temp file + rename). Returns True on success."""
+        if self.file_path is None:
+            # Memory-only storage: nothing to write
+            return True
+        tmp_path: Optional[str] = None
         try:
-            # Atomic write pattern could be better, but simple write is sufficient for now
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, indent=4)
+            with tempfile.NamedTemporaryFile(
+                'wb', dir=os.path.dirname(self.file_path), suffix='.tmp', delete=False
+            ) as f:
+                tmp_path = f.name
+                f.write(dumps(self.data, indent=True))
+            os.replace(tmp_path, self.file_path)
+            return True
         except IOError as e:
             logger.error(f"Failed to save storage to {self.file_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+
+    def flush(self) -> None:
+        """Writes memory to disk if it changed since the last flush."""
+        with self._lock:
+            if self._dirty and self._save_data():
+                self._dirty = False
+                self._updates_since_flush = 0
 
     def update_sender(self, sender_email: str, classification: str) -> bool:
         """
@@ -52,38 +83,54 @@ class Storage:
         Returns:
             bool: True if the sender *just* became a trusted marketing source in this update.
         """
-        if sender_email not in self.data:
-            self.data[sender_email] = {
-                "domain": sender_email.split('@')[-1].lower(),
-                "classifications": {},
-                "last_seen": "",
-                "trusted_marketing_source": False
-            }
+        with self._lock:
+            if sender_email not in self.data:
+                self.data[sender_email] = {
+                    "domain": domain_of(sender_email),
+                    "classifications": {},
+                    "last_seen": "",
+                    "trusted_marketing_source": False
+                }
         
-        entry = self.data[sender_email]
-        entry["last_seen"] = datetime.now().isoformat()
+            entry = self.data[sender_email]
+            entry["last_seen"] = datetime.now().isoformat()
         
-        # Update classification counts
-        current_count = entry["classifications"].get(classification, 0)
-        entry["classifications"][classification] = current_count + 1
+            # Update classification counts
+            current_count = entry["classifications"].get(classification, 0)
+            entry["classifications"][classification] = current_count + 1
         
-        # Check for trusted status upgrade
-        was_trusted = entry["trusted_marketing_source"]
+            # Check for trusted status upgrade
+            was_trusted = entry["trusted_marketing_source"]
         
-        if classification in MARKETING_TYPES:
-            total_marketing_count = sum(entry["classifications"].get(t, 0) for t in MARKETING_TYPES)
-            if total_marketing_count >= TRUSTED_SENDER_THRESHOLD:
-                entry["trusted_marketing_source"] = True
+            if classification in MARKETING_TYPES:
+                total_marketing_count = sum(
+                    count for category, count in entry["classifications"].items() if category in MARKETING_TYPES
+                )
+                if total_marketing_count >= TRUSTED_SENDER_THRESHOLD:
+                    entry["trusted_marketing_source"] = True
         
-        self._save_data()
+            self._dirty = True
+            self._updates_since_flush += 1
+            if STORAGE_FLUSH_INTERVAL and self._updates_since_flush >= STORAGE_FLUSH_INTERVAL:
+                self.flush()
         
-        # Return True only if it JUST became trusted
-        return entry["trusted_marketing_source"] and not was_trusted
+            # Return True only if it JUST became trusted
+            return entry["trusted_marketing_source"] and not was_trusted
 
     def is_trusted(self, sender_email: str) -> bool:
         """Checks if a sender is a trusted marketing source."""
         return self.data.get(sender_email, {}).get("trusted_marketing_source", False)
 
+    def get_cached_classification(self, sender_email: str) -> Optional[str]:
+        """Returns the sender's most frequent marketing classification, or None if it has none."""
+        entry = self.data.get(sender_email)
+        if not entry:
+            return None
+        counts = {k: v for k, v in entry["classifications"].items() if k in MARKETING_TYPES}
+        if not counts:
+            return None
+        return max(counts, key=lambda k: counts[k])
+
     def get_sender_data(self, sender_email: str) -> Optional[Dict[str, Any]]:
         """Retrieves raw data for a specific sender."""
         return self.data.get(sender_email)
@@ -0,0 +1,75 @@
+"""
+Shared helpers for the Gmail Cleanup Agent.
+"""
+import functools
+import itertools
+import json
+from typing import Any, Iterable, Iterator, List, TypeVar, Union
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to stdlib json
+    orjson = None  # type: ignore[assignment]
+
+T = TypeVar('T')
+
+@functools.lru_cache(maxsize=4096)
+def domain_of(email: str) -> str:
+    """
+    Extract the lowercased domain from an email address.
+    Cached because the same senders appear many times in a run.
+    
+    Args:
+        email: The email address.
+        
+    Returns:
+        The part after the last '@', lowercased (the whole string if there is no '@').
+    """
+    return email.rsplit('@', 1)[-1].lower()
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    """
+    Split an iterable into lists of at most `size` items (the last one may be shorter).
+    
+    Args:
+        items: The items to split.
+        size: Maximum chunk length.
+        
+    Yields:
+        Consecutive chunks, in order.
+    """
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON, with orjson when it is installed.
+    
+    Args:
+        obj: The value to serialize.
+        indent: Pretty-print with a two-space indent.
+        
+    Returns:
+        The encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(obj, indent=2 if indent else None).encode('utf-8')
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Parse a JSON document, with orjson when it is installed.
+    
+    Args:
+        data: The encoded JSON document.
+        
+    Returns:
+        The decoded value.
+        
+    Raises:
+        json.JSONDecodeError: If the document is not valid JSON (orjson's error subclasses it).
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
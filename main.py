@@ -10,16 +10,170 @@ Orchestrates the entire workflow:
 7. Create filters for trusted senders.
 """
 import argparse
+import queue
 import sys
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import TYPE_CHECKING, Optional, Any, List, Tuple
 
 from gmail_agent.gmail_service import GmailService
 from gmail_agent.mock_service import MockGmailService
 from gmail_agent.llm_service import LLMService
 from gmail_agent.storage import Storage
+from gmail_agent.cache import Cache
 from gmail_agent.classifier import Classifier
 from gmail_agent.actions import ActionHandler
-from gmail_agent.logger import logger
+from gmail_agent.logger import logger, stop_logging
+from gmail_agent.models import MessageBatch
+from gmail_agent.config import TRUSTED_SENDER_CONFIDENCE, CONFIDENCE_REVIEW, LOCAL_MODEL_PATH
+
+if TYPE_CHECKING:
+    from gmail_agent.local_classifier import LocalClassifier
+
+def fetch_pages(gmail: Any, limit: int, pages: "queue.Queue[Optional[MessageBatch]]",
+                stop: threading.Event) -> None:
+    """
+    Producer: list messages page by page and put each page's batch on the queue.
+    Always finishes by putting None, so the consumer stops even if listing fails.
+    
+    Args:
+        gmail: The Gmail service (real or mock).
+        limit: Maximum number of messages to process.
+        pages: Queue receiving one MessageBatch per page.
+        stop: Set by the consumer to stop fetching; checked between pages.
+    """
+    try:
+        for page in gmail.iter_messages(max_results=limit):
+            if stop.is_set():
+                break
+            logger.info(f"Found {len(page)} messages to process.")
+            pages.put(gmail.get_message_details_batch([msg['id'] for msg in page]))
+    finally:
+        pages.put(None)
+
+class Agent:
+    """
+    Holds the services for one run. Each service is created on first access, so
+    a run only pays for what it uses (e.g. no LLM session when nothing needs classifying).
+    """
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+
+    @cached_property
+    def cache(self) -> Optional[Cache]:
+        # Mock runs stay out of the on-disk cache so fake data never leaks into real runs
+        return None if self.args.mock else Cache()
+
+    @cached_property
+    def gmail(self) -> Any:  # Union[GmailService, MockGmailService]
+        return MockGmailService() if self.args.mock else GmailService(cache=self.cache)
+
+    @cached_property
+    def llm(self) -> LLMService:
+        return LLMService(cache=self.cache)
+
+    @cached_property
+    def local_classifier(self) -> Optional["LocalClassifier"]:
+        if not LOCAL_MODEL_PATH:
+            return None
+        # Imported here: loading torch/transformers adds seconds to startup
+        from gmail_agent.local_classifier import LocalClassifier
+        return LocalClassifier()
+
+    @cached_property
+    def storage(self) -> Storage:
+        return Storage()
+
+    @cached_property
+    def classifier(self) -> Classifier:
+        return Classifier()
+
+    @cached_property
+    def actions(self) -> ActionHandler:
+        return ActionHandler(self.gmail, dry_run=self.args.dry_run)
+
+    def close(self) -> None:
+        """Flush queued actions and sender memory, for the services that were created."""
+        # cached_property stores created services in the instance __dict__
+        if 'actions' in self.__dict__:
+            # Apply queued Label/Archive actions in bulk (also for messages handled before a failure)
+            self.actions.flush()
+        if 'storage' in self.__dict__:
+            # Persist sender memory once per run
+            self.storage.flush()
+
+def process_batch(batch: MessageBatch, agent: Agent) -> None:
+    """
+    Run safety checks, classification and actions for one batch of fetched messages.
+    
+    Args:
+        batch: Messages as returned by `get_message_details_batch`.
+        agent: Provides the services; each one is created the first time it is needed.
+    """
+    # 1. Safety Checks (Pre-LLM): protected emails are always SKIP, so they
+    #    are dropped here and never cost an Ollama request
+    keyword_hits = agent.classifier.match_protected_keywords(list(zip(batch.subjects, batch.snippets)))
+    # (index into batch, cached classification for trusted senders)
+    screened: List[Tuple[int, Optional[str]]] = []
+    for i, keyword in enumerate(keyword_hits):
+        email_address = batch.email_addresses[i]
+        logger.info(f"Processing: {batch.subjects[i]} | From: {batch.senders[i]}")
+
+        if agent.classifier.is_safe_sender(email_address):
+            logger.info(f"Skipping protected sender: {email_address}")
+            continue
+        
+        if keyword is not None:
+            logger.info(f"Skipping protected content (keyword '{keyword}').")
+            continue
+
+        # Trusted senders reuse their established classification and skip the LLM
+        cached = None
+        if agent.storage.is_trusted(email_address):
+            cached = agent.storage.get_cached_classification(email_address)
+        screened.append((i, cached))
+
+    # 2. Classify: local model first (if configured), then the LLM for anything it
+    #    is unsure about (several emails per prompt, prompts sent concurrently)
+    items = [(batch.subjects[i], batch.snippets[i], batch.senders[i]) for i, cached in screened if cached is None]
+    results: List[Optional[Tuple[str, float]]] = [None] * len(items)
+    if agent.local_classifier is not None and items:
+        for j, (label, conf) in enumerate(agent.local_classifier.classify_batch(items)):
+            if conf >= CONFIDENCE_REVIEW:
+                results[j] = (label, conf)
+
+    fallback = [j for j, result in enumerate(results) if result is None]
+    if fallback:
+        for j, result in zip(fallback, agent.llm.classify_emails_batch([items[j] for j in fallback])):
+            results[j] = result
+    # Every slot is filled by now; the IMPORTANT/0.0 default (never archived) only guards the types
+    classified = iter([result if result is not None else ("IMPORTANT", 0.0) for result in results])
+
+    for i, cached in screened:
+        email_address = batch.email_addresses[i]
+        if cached is not None:
+            classification, confidence = cached, TRUSTED_SENDER_CONFIDENCE
+            logger.info(f"Using cached classification for trusted sender {email_address}")
+        else:
+            classification, confidence = next(classified)
+
+        logger.info(f"Classified {batch.ids[i]} as {classification} ({confidence:.2f})")
+
+        # 3. Update Memory
+        just_became_trusted = agent.storage.update_sender(email_address, classification)
+        is_trusted = agent.storage.is_trusted(email_address)
+
+        # 4. Determine Action
+        action = agent.classifier.determine_action(classification, confidence)
+        
+        # 5. Execute Action
+        agent.actions.execute_action(batch.ids[i], action, classification)
+
+        # 6. Filter Automation
+        if just_became_trusted:
+            logger.info(f"Sender {email_address} just became trusted!")
+            agent.actions.create_filter_if_trusted(email_address, classification, is_trusted)
 
 def main() -> None:
     """
@@ -34,68 +188,35 @@ def main() -> None:
 
     logger.info(f"Starting Gmail Agent (Dry Run: {args.dry_run}, Mock: {args.mock})")
 
+    agent = Agent(args)
     try:
-        # Initialize Services
-        gmail: Any  # Union[GmailService, MockGmailService]
-        if args.mock:
-            gmail = MockGmailService()
-        else:
-            gmail = GmailService()
-            
-        llm = LLMService()
-        storage = Storage()
-        classifier = Classifier()
-        actions = ActionHandler(gmail, dry_run=args.dry_run)
-
-        # List Messages
-        messages = gmail.list_messages(max_results=args.limit)
-        logger.info(f"Found {len(messages)} messages to process.")
-
-        for msg in messages:
-            details = gmail.get_message_details(msg['id'])
-            if not details:
-                continue
-
-            sender = details['sender']
-            email_address = details['email_address']
-            subject = details['subject']
-            snippet = details['snippet']
-
-            logger.info(f"Processing: {subject} | From: {sender}")
-
-            # 1. Safety Checks (Pre-LLM)
-            if classifier.is_safe_sender(email_address):
-                logger.info(f"Skipping protected sender: {email_address}")
-                continue
-            
-            if classifier.is_safe_content(subject, snippet):
-                logger.info("Skipping protected content.")
-                continue
-
-            # 2. Classify
-            classification, confidence = llm.classify_email(subject, snippet, sender)
-            logger.info(f"Classified as {classification} ({confidence:.2f})")
-
-            # 3. Update Memory
-            just_became_trusted = storage.update_sender(email_address, classification)
-            is_trusted = storage.is_trusted(email_address)
-
-            # 4. Determine Action
-            action = classifier.determine_action(classification, confidence)
-            
-            # 5. Execute Action
-            actions.execute_action(details['id'], action, classification)
-
-            # 6. Filter Automation
-            if just_became_trusted:
-                logger.info(f"Sender {email_address} just became trusted!")
-                actions.create_filter_if_trusted(email_address, classification, is_trusted)
+        # List and fetch messages page by page on a background thread, so later
+        # pages download while earlier ones are being classified
+        pages: "queue.Queue[Optional[MessageBatch]]" = queue.Queue()
+        stop = threading.Event()
+        with ThreadPoolExecutor(max_workers=1) as producer:
+            producing = producer.submit(fetch_pages, agent.gmail, args.limit, pages, stop)
+            try:
+                while (batch := pages.get()) is not None:
+                    process_batch(batch, agent)
+            finally:
+                # On an error or Ctrl-C, stop the producer after its current page
+                # instead of waiting here for it to fetch everything up to --limit
+                stop.set()
+            # Re-raise any error from the producer thread
+            producing.result()
 
     except Exception as e:
         logger.error(f"Fatal error: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        agent.close()
 
     logger.info("Run complete.")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Drain the background log queue before the interpreter exits
+        stop_logging()